@@ -21,7 +21,7 @@ if __name__ == "__main__":
     guessed_phrases = autocompleter.guess_full_strings(corrected_tokens)
 
     # REDIS EXAMPLE
-    redis_client = redis.from_url("http://localhost:6379")
+    redis_client = redis.from_url("redis://localhost:6379")
 
     autocompleter = RedisStorageAutoCompleter(redis_client)
     autocompleter.train_from_strings(movie_titles)
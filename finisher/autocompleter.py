@@ -1,14 +1,11 @@
 from abc import ABCMeta
 from abc import abstractmethod
-from collections import Counter, defaultdict
+from collections import Counter, OrderedDict, defaultdict
+import heapq
+from multiprocessing import Pool
 import re
-
-try:
-    xrange
-    range = xrange
-    iteritems = lambda d: d.iteritems()
-except NameError:
-    iteritems = lambda d: d.items()
+from sys import intern
+from uuid import uuid4
 
 
 class RequiresTraining(Exception):
@@ -16,17 +13,97 @@ class RequiresTraining(Exception):
     pass
 
 
+class _AlphaNumericTable(dict):
+    """ str.translate() table that lowercases alphanumeric characters, keeps
+    spaces and drops everything else.  Entries are filled in the first time a
+    character is seen, so lookups after that stay in C. """
+
+    def __missing__(self, ordinal):
+        ch = chr(ordinal)
+        translated = ch.lower() if ch.isalnum() or ch == ' ' else None
+        self[ordinal] = translated
+        return translated
+
+
+_ALPHA_NUMERIC_TABLE = _AlphaNumericTable()
+
+
+def _to_alpha_numeric(input_string):
+    return input_string.translate(_ALPHA_NUMERIC_TABLE)
+
+
+_ALPHA_WORD_PATTERN = re.compile('[a-z]+')
+
+
+def _to_alpha_words_list(text):
+    return _ALPHA_WORD_PATTERN.findall(text.lower())
+
+
+# Training works on slices of the input through the module level functions
+# below so that they can be shipped to worker processes; each returns the
+# partial mappings for its slice.
+
+def _tokenize_strings(input_string_list):
+    token_to_full_string = defaultdict(set)
+    for input_string in input_string_list:
+        for token in _to_alpha_numeric(input_string).split():
+            token_to_full_string[token].add(input_string)
+    return token_to_full_string
+
+
+def _train_chunk(input_string_list):
+    # the spellchecker's single pass: tokens for the tokenizer and word
+    # counts for the spellchecker, so its input is only shipped once
+    token_to_full_string = defaultdict(set)
+    token_to_count = Counter()
+    for input_string in input_string_list:
+        for token in _to_alpha_numeric(input_string).split():
+            token_to_full_string[token].add(input_string)
+        token_to_count.update(_to_alpha_words_list(input_string))
+    return token_to_full_string, token_to_count
+
+
+def _n_grams_for_tokens(tokens, min_n_gram_size, max_n_gram_size):
+    # the same token recurs across many training strings, so prefixes are
+    # generated once per distinct token rather than once per occurrence
+    n_gram_to_tokens = defaultdict(set)
+    for token in tokens:
+        if len(token) < min_n_gram_size:
+            n_gram_to_tokens[token].add(token)
+            continue
+        longest_n_gram = len(token)
+        if max_n_gram_size and max_n_gram_size < longest_n_gram:
+            longest_n_gram = max_n_gram_size
+        for string_size in range(min_n_gram_size, longest_n_gram + 1):
+            n_gram_to_tokens[token[:string_size]].add(token)
+    return n_gram_to_tokens
+
+
+def _merge_sets(dict_obj, partial_dict):
+    for key, value_set in partial_dict.items():
+        dict_obj[key] |= value_set
+
+
+def _ranking_key(full_string__score):
+    # highest score first, with ties going to the alphabetically first
+    # string so that the order never depends on set iteration order
+    full_string, score = full_string__score
+    return -score, full_string
+
+
 class BaseObject(object):
     def __init__(self, *args, **kwargs):
         super(BaseObject, self).__init__()
 
 
-class AbstractTokenizer(BaseObject):
+class AbstractTokenizer(BaseObject, metaclass=ABCMeta):
 
-    __metaclass__ = ABCMeta
-
-    def __init__(self, min_n_gram_size=1, **extras):
+    def __init__(self, min_n_gram_size=1, max_n_gram_size=None, training_processes=1, **extras):
+        if max_n_gram_size and max_n_gram_size < min_n_gram_size:
+            raise ValueError("max_n_gram_size must not be less than min_n_gram_size")
         self.min_n_gram_size = min_n_gram_size
+        self.max_n_gram_size = max_n_gram_size
+        self.training_processes = training_processes
         super(AbstractTokenizer, self).__init__(**extras)
 
     @abstractmethod
@@ -49,46 +126,141 @@ class AbstractTokenizer(BaseObject):
     def get_tokens_for_n_gram(self, n_gram, default_empty=None):
         pass
 
+    @abstractmethod
+    def get_full_strings_for_tokens(self, tokens, default_empty=None):
+        pass
+
+    @abstractmethod
+    def get_tokens_for_n_grams(self, n_grams, default_empty=None):
+        pass
+
+    @abstractmethod
+    def _get_model_version(self):
+        pass
+
+    @abstractmethod
+    def _set_model_version(self, model_version):
+        pass
+
+    @abstractmethod
+    def _get_stored_max_n_gram_size(self):
+        pass
+
+    @abstractmethod
+    def _store_max_n_gram_size(self, max_n_gram_size):
+        pass
+
+    def _get_model_version_and_max_n_gram_size(self):
+        return self._get_model_version(), self._get_stored_max_n_gram_size()
+
+    def _model_changed(self):
+        # a random version rather than a counter, so that clearing the
+        # storage and training it again can never bring back an old version
+        self._set_model_version(uuid4().hex)
+
+    def get_tokens_for_n_grams_union(self, n_grams):
+        """ Returns the set of every token that any of the input n grams maps to. """
+        return set().union(*self.get_tokens_for_n_grams(n_grams, ()).values())
+
+    def _get_tokens_for_n_grams_union_and_max_n_gram_size(self, n_grams):
+        return self.get_tokens_for_n_grams_union(n_grams), self._get_stored_max_n_gram_size()
+
+    def get_tokens_for_prefixes(self, prefixes, default_empty=None):
+        """ Maps each prefix to the tokens that start with it.  Prefixes longer
+        than the max_n_gram_size the model was trained with are resolved by
+        filtering the tokens stored for their leading characters. """
+        return self._get_tokens_for_prefixes(
+            prefixes, self._get_stored_max_n_gram_size(), default_empty)
+
+    def _get_tokens_for_prefixes(self, prefixes, max_n_gram_size, default_empty=None):
+        if not max_n_gram_size:
+            return self.get_tokens_for_n_grams(prefixes, default_empty)
+        prefixes = list(prefixes)
+        n_gram_to_tokens = self.get_tokens_for_n_grams(
+            {prefix[:max_n_gram_size] for prefix in prefixes}, set())
+        prefix_to_tokens = {}
+        for prefix in prefixes:
+            tokens = n_gram_to_tokens[prefix[:max_n_gram_size]]
+            if len(prefix) > max_n_gram_size:
+                encoded_prefix = prefix.encode("utf-8")
+                tokens = {token for token in tokens
+                          if token.startswith(encoded_prefix if isinstance(token, bytes) else prefix)}
+            prefix_to_tokens[prefix] = tokens or default_empty
+        return prefix_to_tokens
+
+    def get_tokens_for_prefix(self, prefix, default_empty=None):
+        """ Returns the tokens that start with the input prefix. """
+        return self.get_tokens_for_prefixes([prefix], default_empty)[prefix]
+
     def bust_cache(self):
         """ Clears all cached values. """
         self._clear_tokenizer_storage()
-
-    def _to_alpha_numeric(self, input_string):
-        return ''.join(ch.lower() for ch in input_string if ch.isalnum() or ch == ' ')
+        self._model_changed()
+
+    def _map_training_chunks(self, func, input_string_list):
+        """ Applies func to the training input and returns its partial results,
+        splitting the input across training_processes worker processes when
+        more than one is configured.  Where workers are spawned (Windows,
+        macOS) the caller must train under an `if __name__ == "__main__":`
+        guard. """
+        if self.training_processes <= 1:
+            return [func(input_string_list)]
+        input_string_list = list(input_string_list)
+        chunk_size = -(-len(input_string_list) // self.training_processes) or 1
+        chunks = [input_string_list[start:start + chunk_size]
+                  for start in range(0, len(input_string_list), chunk_size)]
+        if len(chunks) <= 1:
+            # empty or single string input is not worth a pool
+            return [func(input_string_list)]
+        pool = Pool(self.training_processes)
+        try:
+            return pool.map(func, chunks)
+        finally:
+            pool.close()
+            pool.join()
 
     def train_from_strings(self, input_string_list):
         """ Trains the tokenizer such that input tokens from a user can
         be mapped to the strings input here. """
-        token_to_full_string = defaultdict(set)
-        n_gram_to_tokens = defaultdict(set)
-
-        for input_string in input_string_list:
-            alpha_numeric_input_string = self._to_alpha_numeric(input_string)
-            tokens = alpha_numeric_input_string.split()
-            for token in tokens:
-                token_to_full_string[token].add(input_string)
-                if len(token) < self.min_n_gram_size:
-                    n_gram_to_tokens[token].add(token)
-                for string_size in range(self.min_n_gram_size, len(token) + 1):
-                    n_gram = token[:string_size]
-                    n_gram_to_tokens[n_gram].add(token)
-
-        self._store_token_to_full_string(dict(token_to_full_string))
+        partials = self._map_training_chunks(_tokenize_strings, input_string_list)
+        token_to_full_string = partials[0]
+        for partial_token_to_full_string in partials[1:]:
+            _merge_sets(token_to_full_string, partial_token_to_full_string)
+        self._store_tokens(token_to_full_string)
+        self._model_changed()
+
+    def _store_tokens(self, token_to_full_string):
+        # the interned token is the object kept by the n gram sets below and
+        # by the spellchecker's counts, so each distinct token is stored once
+        token_to_full_string = {intern(token): full_strings
+                                for token, full_strings in token_to_full_string.items()}
+        n_gram_to_tokens = _n_grams_for_tokens(
+            token_to_full_string, self.min_n_gram_size, self.max_n_gram_size)
+
+        self._store_token_to_full_string(token_to_full_string)
         self._store_n_gram_to_tokens(dict(n_gram_to_tokens))
+        # the cap is kept with the model so that every instance queries it
+        # the same way; after mixed trainings the smallest cap is the one
+        # that all of the stored tokens have n grams for
+        if self.max_n_gram_size:
+            stored_max_n_gram_size = self._get_stored_max_n_gram_size()
+            if not stored_max_n_gram_size or self.max_n_gram_size < stored_max_n_gram_size:
+                self._store_max_n_gram_size(self.max_n_gram_size)
 
 
-class AbstractSpellChecker(AbstractTokenizer):
+class AbstractSpellChecker(AbstractTokenizer, metaclass=ABCMeta):
 
-    __metaclass__ = ABCMeta
+    _ALPHABET = tuple('abcdefghijklmnopqrstuvwxyz')
 
-    def __init__(self, typo_deviations=2, max_word_length=10, **extras):
+    def __init__(self, typo_deviations=2, max_word_length=10, correction_cache_size=10000,
+                 **extras):
         self.typo_deviations = typo_deviations
         self.max_word_length = max_word_length
+        self.correction_cache_size = correction_cache_size
+        self._corrected_tokens = OrderedDict()
+        self._corrected_tokens_version = None
         super(AbstractSpellChecker, self).__init__(**extras)
 
-    def _to_alpha_words_list(self, text):
-        return re.findall('[a-z]+', text.lower())
-
     @abstractmethod
     def get_count_for_token(self, token, default_empty=0):
         pass
@@ -109,65 +281,131 @@ class AbstractSpellChecker(AbstractTokenizer):
         """ Clears the cache so that model can be re-trained. """
         super(AbstractSpellChecker, self).bust_cache()
         self._clear_spellcheck_storage()
+        self._model_changed()
 
     def _possible_typos(self, word):
-        alphabet = 'abcdefghijklmnopqrstuvwxyz'
-
-        splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
-        deletes = [a + b[1:] for a, b in splits if b]
-        transposes = [a + b[1] + b[0] + b[2:] for a, b in splits if len(b) > 1]
-        replaces = [a + c + b[1:] for a, b in splits for c in alphabet if b]
-        inserts = [a + c + b for a, b in splits for c in alphabet]
-        return set(deletes + transposes + replaces + inserts)
+        alphabet = self._ALPHABET
+
+        # deletes, transposes, replaces and inserts all go straight into one
+        # set rather than through four intermediate lists
+        typos = set()
+        add = typos.add
+        for i in range(len(word) + 1):
+            a, b = word[:i], word[i:]
+            for c in alphabet:
+                add(a + c + b)
+            if not b:
+                continue
+            rest = b[1:]
+            add(a + rest)
+            if rest:
+                add(a + rest[0] + b[0] + rest[1:])
+            for c in alphabet:
+                add(a + c + rest)
+        return typos
 
     def _extended_typos(self, word):
-        if len(word) >= self.max_word_length:
-            return set()
-        deviations = self._possible_typos(word)
-        all_deviations = set() | deviations
+        # expands one edit at a time and stops at the first depth that
+        # produces a known word, so deeper expansions are only paid for
+        # when every shallower one missed
+        possible_typos = self._possible_typos
+        deviations = possible_typos(word)
+        existing = self._words_that_exist(deviations)
+        if existing or len(word) >= self.max_word_length:
+            return existing
+        all_deviations = set(deviations)
         for _ in range(self.typo_deviations - 1):
-            deviations = \
-                {item for deviation in deviations for item in self._possible_typos(deviation)}
+            next_deviations = set()
+            for deviation in deviations:
+                next_deviations.update(possible_typos(deviation))
+            # only strings not seen at a shallower depth need expanding again
+            deviations = next_deviations - all_deviations
+            existing = self._words_that_exist(deviations)
+            if existing:
+                return existing
             all_deviations |= deviations
-        deviation_to_count = self.get_counts_for_tokens(all_deviations)
-        return {deviation for deviation in all_deviations if deviation_to_count[deviation]}
+        return {}
 
     def _words_that_exist(self, words):
-        return set(w for w in words if self.get_count_for_token(w))
+        """ Returns a mapping of the input words present in the trained model
+        to their counts, fetched in a single batch. """
+        word_to_count = self.get_counts_for_tokens(words)
+        return {word: count for word, count in word_to_count.items() if count}
 
     def train_from_strings(self, input_string_list):
         """ Mutates the class such that input text from the user can be
         auto corrected to the input provided here. """
-        super(AbstractSpellChecker, self).train_from_strings(input_string_list)
-
-        token_to_count = Counter()
-        for input_string in input_string_list:
-            alpha_words = self._to_alpha_words_list(input_string)
-            for token in alpha_words:
-                token_to_count[token] += 1
-        self._store_token_to_count(dict(token_to_count))
+        partials = self._map_training_chunks(_train_chunk, input_string_list)
+        token_to_full_string, token_to_count = partials[0]
+        for partial_token_to_full_string, partial_token_to_count in partials[1:]:
+            _merge_sets(token_to_full_string, partial_token_to_full_string)
+            token_to_count.update(partial_token_to_count)
+        self._store_tokens(token_to_full_string)
+        self._store_token_to_count(
+            {intern(token): count for token, count in token_to_count.items()})
+        self._model_changed()
+
+    def _sync_corrected_tokens(self):
+        # the model can be retrained or busted through any instance or
+        # process sharing its storage, so memoized corrections are only
+        # trusted while the stored model version is unchanged.  the n gram
+        # cap is read along with it and returned for the whole call
+        if not self.correction_cache_size:
+            return self._get_stored_max_n_gram_size()
+        model_version, max_n_gram_size = self._get_model_version_and_max_n_gram_size()
+        if model_version != self._corrected_tokens_version:
+            self._corrected_tokens.clear()
+            self._corrected_tokens_version = model_version
+        return max_n_gram_size
 
     def correct_token(self, token):
         """ Given an input token, returns a valid token present in the trained model. """
+        max_n_gram_size = self._sync_corrected_tokens()
+        return self._correct_token_memoized(token, max_n_gram_size)
+
+    def _correct_token_memoized(self, token, max_n_gram_size):
+        # a least recently used memo: hits move to the end and the entry at
+        # the front is evicted once correction_cache_size is reached
         token = token.lower()
-        if self.get_tokens_for_n_gram(token) is not None:
+        corrected_tokens = self._corrected_tokens
+        try:
+            corrected_token = corrected_tokens[token]
+        except KeyError:
+            pass
+        else:
+            corrected_tokens.move_to_end(token)
+            return corrected_token
+        corrected_token = self._correct_token_uncached(token, max_n_gram_size)
+        if self.correction_cache_size:
+            if len(corrected_tokens) >= self.correction_cache_size:
+                corrected_tokens.popitem(last=False)
+            corrected_tokens[token] = corrected_token
+        return corrected_token
+
+    def _correct_token_uncached(self, token, max_n_gram_size):
+        # a known word is settled by one count lookup, before fetching the
+        # possibly large set of tokens stored under its prefix.  a store
+        # trained by the tokenizer alone has no counts, and still knows its
+        # prefixes
+        try:
+            if self._words_that_exist([token]):
+                return token
+        except RequiresTraining:
+            pass
+        if self._get_tokens_for_prefixes([token], max_n_gram_size)[token] is not None:
             return token
-        candidates = (self._words_that_exist([token]) or
-                      self._words_that_exist(self._possible_typos(token)) or
-                      self._extended_typos(token) or
-                      [token])
-        return max(candidates, key=self.get_count_for_token)
+        candidate_to_count = self._extended_typos(token) or {token: 0}
+        return max(candidate_to_count, key=candidate_to_count.__getitem__)
 
     def correct_phrase(self, text):
         """ Given an input blob of text, returns a list of valid tokens that can be used
         for autocomplete. """
-        tokens = text.split()
-        return [self.correct_token(token) for token in tokens]
-
+        max_n_gram_size = self._sync_corrected_tokens()
+        correct_token = self._correct_token_memoized
+        return [correct_token(token, max_n_gram_size) for token in text.split()]
 
-class AbstractAutoCompleter(AbstractSpellChecker):
 
-    __metaclass__ = ABCMeta
+class AbstractAutoCompleter(AbstractSpellChecker, metaclass=ABCMeta):
 
     def __init__(self, min_results=5, max_results=10, score_threshold=0.2, **extras):
         self.min_results = min_results
@@ -176,49 +414,62 @@ class AbstractAutoCompleter(AbstractSpellChecker):
         super(AbstractAutoCompleter, self).__init__(**extras)
 
     def _get_real_tokens_from_possible_n_grams(self, tokens):
-        real_tokens = set()
-        for token in tokens:
-            token_set = self.get_tokens_for_n_gram(token, set())
-            real_tokens |= token_set
+        # the cap is read with the union, so every token is first looked up
+        # as a stored n gram; tokens longer than the cap then find nothing
+        # there and are resolved by filtering on their leading characters
+        real_tokens, max_n_gram_size = \
+            self._get_tokens_for_n_grams_union_and_max_n_gram_size(tokens)
+        if max_n_gram_size:
+            longer_prefixes = [token for token in tokens if len(token) > max_n_gram_size]
+            if longer_prefixes:
+                real_tokens.update(*self._get_tokens_for_prefixes(
+                    longer_prefixes, max_n_gram_size, ()).values())
         return real_tokens
 
     def _get_scored_strings_uncollapsed(self, real_tokens):
-        all_full_strings = set.union(*[self.get_full_strings_for_token(token, set()) for token in real_tokens] + [set()])
+        token_to_full_strings = self.get_full_strings_for_tokens(real_tokens, set())
+        all_full_strings = set().union(*token_to_full_strings.values())
+
+        # everything derived from the query alone is computed once, not per string
+        num_real_tokens = len(real_tokens)
+        real_token_set = set(real_tokens)
+        token_character_counts = list(Counter("".join(real_tokens)).items())
 
         def _get_score(full_string):
-            exact_tokens_matched = len(real_tokens) - len(set(real_tokens) - set(full_string.split(" ")))
-            percent_match_tokens = float(exact_tokens_matched) / len(real_tokens)
-
-            all_token_characters = list("".join(real_tokens))
-            all_string_characters = list(full_string.replace(" ", ""))
-            filtered_string = all_string_characters
-            for match_character in all_token_characters:
-                for outer_index, cursor_character in enumerate(filtered_string):
-                    if cursor_character == match_character:
-                        filtered_string = "".join([char for index, char in enumerate(filtered_string) if index != outer_index])
-                        break
-            characters_consumed = len(all_string_characters) - len(filtered_string)
-            percent_match_raw = float(characters_consumed) / len(all_string_characters)
+            exact_tokens_matched = num_real_tokens - len(real_token_set - set(full_string.split(" ")))
+            percent_match_tokens = float(exact_tokens_matched) / num_real_tokens
+
+            # each query character consumes at most one matching character of
+            # the string, i.e. the size of the multiset intersection.  tokens
+            # never hold spaces, so the string is counted in place rather than
+            # copied without them
+            count = full_string.count
+            characters_consumed = 0
+            for character, token_count in token_character_counts:
+                string_count = count(character)
+                characters_consumed += token_count if token_count < string_count else string_count
+            percent_match_raw = float(characters_consumed) / (len(full_string) - count(" "))
             return 0.66 * percent_match_tokens + 0.333 * percent_match_raw
 
-        full_string__scores = [(s, _get_score(s)) for s in all_full_strings]
-        return sorted(full_string__scores, key=lambda t: t[1], reverse=True)
+        return [(s, _get_score(s)) for s in all_full_strings]
 
     def _combined_scores(self, full_string__scores, num_tokens):
-        collapsed_string_to_score = defaultdict(int)
-        collapsed_string_to_occurence = defaultdict(int)
+        # [summed score, occurrences] per string, accumulated in a single pass
+        collapsed_string_to_totals = defaultdict(lambda: [0.0, 0])
         for full_string, score in full_string__scores:
-            collapsed_string_to_score[full_string] += score
-            collapsed_string_to_occurence[full_string] += 1
-        for full_string in collapsed_string_to_score.keys():
-            percent_match = collapsed_string_to_occurence[full_string] / float(num_tokens)
-            collapsed_string_to_score[full_string] *= percent_match
-        return collapsed_string_to_score
+            totals = collapsed_string_to_totals[full_string]
+            totals[0] += score
+            totals[1] += 1
+        inverse_num_tokens = 1.0 / num_tokens if num_tokens else 0.0
+        return {full_string: score * occurences * inverse_num_tokens
+                for full_string, (score, occurences) in collapsed_string_to_totals.items()}
 
     def _filtered_results(self, full_string__scores):
-        max_possibles = full_string__scores[:self.max_results]
-        if full_string__scores and full_string__scores[0][1] == 1.0:
-            exact_match_str = full_string__scores[0][0]
+        # only the top max_results are ever returned, so select them with a
+        # heap instead of sorting every candidate
+        max_possibles = heapq.nsmallest(self.max_results, full_string__scores, key=_ranking_key)
+        if max_possibles and max_possibles[0][1] == 1.0:
+            exact_match_str = max_possibles[0][0]
             min_len = len(exact_match_str)
             full_string__scores = \
                 [tuple_obj for tuple_obj in full_string__scores if len(tuple_obj[0]) >= min_len]
@@ -226,7 +477,8 @@ class AbstractAutoCompleter(AbstractSpellChecker):
         possibles_within_thresh = \
             [tuple_obj for tuple_obj in full_string__scores if tuple_obj[1] >= self.score_threshold]
         if len(possibles_within_thresh) > self.min_results:
-            min_possibles = possibles_within_thresh[:self.max_results]
+            min_possibles = heapq.nsmallest(self.max_results, possibles_within_thresh,
+                                            key=_ranking_key)
         else:
             min_possibles = max_possibles[:self.min_results]
         return [tuple_obj[0] for tuple_obj in min_possibles]
@@ -234,23 +486,24 @@ class AbstractAutoCompleter(AbstractSpellChecker):
     def _cleaned_tokens(self, token_list):
         cleaned_tokens = []
         for token in token_list:
-            try:
-                unicode(token)
-            except UnicodeDecodeError:
-                continue
+            # redis hands tokens back as bytes
+            if isinstance(token, bytes):
+                try:
+                    token = token.decode("utf-8")
+                except UnicodeDecodeError:
+                    continue
             cleaned_tokens.append(token)
         return cleaned_tokens
 
     def guess_full_strings(self, token_list):
         """ Given an input list of tokens, returns an ordered list of phrases
-        that most likely aligns with the input. """
+        that most likely aligns with the input.  Phrases that score the same
+        are ordered alphabetically. """
         real_tokens = self._get_real_tokens_from_possible_n_grams(token_list)
         real_tokens = self._cleaned_tokens(real_tokens)
         full_string__scores = self._get_scored_strings_uncollapsed(real_tokens)
         collapsed_string_to_score = self._combined_scores(full_string__scores, len(token_list))
-        full_string__scores = sorted(iteritems(collapsed_string_to_score),
-                                     key=lambda t: t[1], reverse=True)
-        return self._filtered_results(full_string__scores)
+        return self._filtered_results(list(collapsed_string_to_score.items()))
 
 
 class DictStorageTokenizer(AbstractTokenizer):
@@ -266,12 +519,20 @@ class DictStorageTokenizer(AbstractTokenizer):
         except KeyError:
             raise RequiresTraining("Must call train_from_strings() before using this property")
 
+    def get_full_strings_for_tokens(self, tokens, default_empty=None):
+        attr_key = "token_to_full_string"
+        try:
+            token_to_full_string = self._cls_cache[attr_key]
+        except KeyError:
+            raise RequiresTraining("Must call train_from_strings() before using this property")
+        return {token: token_to_full_string.get(token, default_empty) for token in tokens}
+
     def _store_token_to_full_string(self, token_to_full_string_dict):
         attr_key = 'token_to_full_string'
         if attr_key not in self._cls_cache:
             self._cls_cache[attr_key] = token_to_full_string_dict
         else:
-            for token, full_string_set in iteritems(token_to_full_string_dict):
+            for token, full_string_set in token_to_full_string_dict.items():
                 try:
                     self._cls_cache[attr_key][token] |= full_string_set
                 except KeyError:
@@ -284,17 +545,37 @@ class DictStorageTokenizer(AbstractTokenizer):
         except KeyError:
             raise RequiresTraining("Must call train_from_strings() before using this property")
 
+    def get_tokens_for_n_grams(self, n_grams, default_empty=None):
+        attr_key = "n_gram_to_tokens"
+        try:
+            n_gram_to_tokens = self._cls_cache[attr_key]
+        except KeyError:
+            raise RequiresTraining("Must call train_from_strings() before using this property")
+        return {n_gram: n_gram_to_tokens.get(n_gram, default_empty) for n_gram in n_grams}
+
     def _store_n_gram_to_tokens(self, n_gram_to_tokens_dict):
         attr_key = 'n_gram_to_tokens'
         if attr_key not in self._cls_cache:
             self._cls_cache[attr_key] = n_gram_to_tokens_dict
         else:
-            for n_gram, token_set in iteritems(n_gram_to_tokens_dict):
+            for n_gram, token_set in n_gram_to_tokens_dict.items():
                 try:
                     self._cls_cache[attr_key][n_gram] |= token_set
                 except KeyError:
                     self._cls_cache[attr_key][n_gram] = token_set
 
+    def _get_model_version(self):
+        return self._cls_cache.get("model_version")
+
+    def _set_model_version(self, model_version):
+        self._cls_cache["model_version"] = model_version
+
+    def _get_stored_max_n_gram_size(self):
+        return self._cls_cache.get("max_n_gram_size")
+
+    def _store_max_n_gram_size(self, max_n_gram_size):
+        self._cls_cache["max_n_gram_size"] = max_n_gram_size
+
     def _clear_tokenizer_storage(self):
         self._cls_cache.clear()
 
@@ -303,9 +584,10 @@ class DictStorageSpellChecker(DictStorageTokenizer, AbstractSpellChecker):
 
     def get_counts_for_tokens(self, token_list, default_empty=0):
         attr_key = "token_to_count"
-        if not self._cls_cache[attr_key]:
+        token_to_count = self._cls_cache.get(attr_key)
+        if not token_to_count:
             raise RequiresTraining("Must call train_from_strings() before using this property")
-        return {token: self._cls_cache[attr_key].get(token, default_empty) for token in token_list}
+        return {token: token_to_count.get(token, default_empty) for token in token_list}
 
     def get_count_for_token(self, token, default_empty=0):
         attr_key = "token_to_count"
@@ -319,7 +601,7 @@ class DictStorageSpellChecker(DictStorageTokenizer, AbstractSpellChecker):
         if attr_key not in self._cls_cache:
             self._cls_cache[attr_key] = token_to_count_dict
         else:
-            for token, count in iteritems(token_to_count_dict):
+            for token, count in token_to_count_dict.items():
                 try:
                     self._cls_cache[attr_key][token] += count
                 except KeyError:
@@ -327,8 +609,7 @@ class DictStorageSpellChecker(DictStorageTokenizer, AbstractSpellChecker):
 
     def _clear_spellcheck_storage(self):
         try:
-            for key in self._cls_cache["token_to_count"].keys():
-                del self._cls_cache["token_to_count"][key]
+            self._cls_cache["token_to_count"].clear()
         except KeyError:
             pass
 
@@ -339,72 +620,156 @@ class DictStorageAutoCompleter(DictStorageSpellChecker, AbstractAutoCompleter):
 
 class RedisStorageTokenizer(AbstractTokenizer):
 
-    def __init__(self, redis_client, use_pipeline=True, **extras):
+    def __init__(self, redis_client, use_pipeline=True, write_batch_size=1000, **extras):
         super(RedisStorageTokenizer, self).__init__(**extras)
         self.redis_client = redis_client
         self.use_pipeline = use_pipeline
+        self.write_batch_size = write_batch_size
 
     def get_client(self):
         if self.use_pipeline:
-            return self.redis_client.pipeline()
+            return self.redis_client.pipeline(transaction=False)
         return self.redis_client
 
+    def _write_batches(self, dict_obj):
+        # bounds the size of each pipeline so large vocabularies are not
+        # buffered into a single giant request
+        items = list(dict_obj.items())
+        for start in range(0, len(items), self.write_batch_size):
+            yield items[start:start + self.write_batch_size]
+
+    def _execute_with_training_check(self, pipe, index_key):
+        # the index is checked in the same round trip as the lookup, so a
+        # model busted through another client is never mistaken for a
+        # trained one with no match.  redis drops empty sets and hashes, so
+        # existence means non-empty.
+        pipe.exists(index_key)
+        results = pipe.execute()
+        if not results.pop():
+            raise RequiresTraining("Must call train_from_strings() before using this property")
+        return results
+
     def get_full_strings_for_token(self, token, default_empty=None):
         try:
             token = token.encode("utf-8")
         except AttributeError:
             pass
-        key_count = self.redis_client.scard("token_to_full_string_keys")
-        if not key_count:
-            raise RequiresTraining("Must call train_from_strings() before using this property")
-        full_strings = self.redis_client.smembers(b"token:" + token) or default_empty
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.smembers(b"token:" + token)
+        full_strings, = self._execute_with_training_check(pipe, "token_to_full_string_keys")
+        full_strings = full_strings or default_empty
         return {s.decode("utf-8") for s in full_strings}
 
+    def get_full_strings_for_tokens(self, tokens, default_empty=None):
+        tokens = list(tokens)
+        if not tokens:
+            return {}
+        pipe = self.redis_client.pipeline(transaction=False)
+        for token in tokens:
+            try:
+                pipe.smembers(b"token:" + token.encode("utf-8"))
+            except AttributeError:
+                pipe.smembers(b"token:" + token)
+        results = self._execute_with_training_check(pipe, "token_to_full_string_keys")
+        token_to_full_strings = {}
+        for token, full_strings in zip(tokens, results):
+            if full_strings:
+                token_to_full_strings[token] = {s.decode("utf-8") for s in full_strings}
+            else:
+                token_to_full_strings[token] = default_empty
+        return token_to_full_strings
+
     def _store_token_to_full_string(self, token_to_full_string_dict):
-        client = self.get_client()
-        for key, full_strings_set in iteritems(token_to_full_string_dict):
-            for full_string in full_strings_set:
-                client.sadd("token:" + key, full_string)
-            client.sadd("token_to_full_string_keys", key)
-        if self.use_pipeline:
-            client.execute()
+        for batch in self._write_batches(token_to_full_string_dict):
+            client = self.get_client()
+            for key, full_strings_set in batch:
+                client.sadd("token:" + key, *full_strings_set)
+            client.sadd("token_to_full_string_keys", *[key for key, _ in batch])
+            if self.use_pipeline:
+                client.execute()
 
     def get_tokens_for_n_gram(self, n_gram, default_empty=None):
-        key_count = self.redis_client.scard("n_gram_to_token_key")
-        if not key_count:
-            raise RequiresTraining("Must call train_from_strings() before using this property")
-        return self.redis_client.smembers("n_gram:" + n_gram) or default_empty
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.smembers("n_gram:" + n_gram)
+        tokens, = self._execute_with_training_check(pipe, "n_gram_to_token_key")
+        return tokens or default_empty
+
+    def get_tokens_for_n_grams(self, n_grams, default_empty=None):
+        n_grams = list(n_grams)
+        if not n_grams:
+            return {}
+        pipe = self.redis_client.pipeline(transaction=False)
+        for n_gram in n_grams:
+            pipe.smembers("n_gram:" + n_gram)
+        token_sets = self._execute_with_training_check(pipe, "n_gram_to_token_key")
+        return {n_gram: token_set or default_empty
+                for n_gram, token_set in zip(n_grams, token_sets)}
+
+    def get_tokens_for_n_grams_union(self, n_grams):
+        keys = ["n_gram:" + n_gram for n_gram in n_grams]
+        if not keys:
+            return set()
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.sunion(keys)
+        tokens, = self._execute_with_training_check(pipe, "n_gram_to_token_key")
+        return tokens
+
+    def _get_tokens_for_n_grams_union_and_max_n_gram_size(self, n_grams):
+        keys = ["n_gram:" + n_gram for n_gram in n_grams]
+        if not keys:
+            return set(), self._get_stored_max_n_gram_size()
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.sunion(keys)
+        pipe.get("max_n_gram_size")
+        tokens, max_n_gram_size = self._execute_with_training_check(pipe, "n_gram_to_token_key")
+        return tokens, int(max_n_gram_size) if max_n_gram_size is not None else None
 
     def _store_n_gram_to_tokens(self, n_gram_to_tokens_dict):
-        client = self.get_client()
-        for n_gram, token_set in iteritems(n_gram_to_tokens_dict):
-            for token in token_set:
-                client.sadd("n_gram:" + n_gram, token)
-            client.sadd("n_gram_to_token_key", n_gram)
-        if self.use_pipeline:
-            client.execute()
+        for batch in self._write_batches(n_gram_to_tokens_dict):
+            client = self.get_client()
+            for n_gram, token_set in batch:
+                client.sadd("n_gram:" + n_gram, *token_set)
+            client.sadd("n_gram_to_token_key", *[n_gram for n_gram, _ in batch])
+            if self.use_pipeline:
+                client.execute()
+
+    def _get_model_version(self):
+        return self.redis_client.get("model_version")
+
+    def _set_model_version(self, model_version):
+        self.redis_client.set("model_version", model_version)
+
+    def _get_stored_max_n_gram_size(self):
+        max_n_gram_size = self.redis_client.get("max_n_gram_size")
+        return int(max_n_gram_size) if max_n_gram_size is not None else None
+
+    def _get_model_version_and_max_n_gram_size(self):
+        model_version, max_n_gram_size = self.redis_client.mget("model_version", "max_n_gram_size")
+        return model_version, int(max_n_gram_size) if max_n_gram_size is not None else None
+
+    def _store_max_n_gram_size(self, max_n_gram_size):
+        self.redis_client.set("max_n_gram_size", max_n_gram_size)
 
     def _clear_tokenizer_storage(self):
         self._clear_token_to_full_strings()
         self._clear_n_gram_to_tokens()
+        self.redis_client.delete("max_n_gram_size")
+
+    def _delete_indexed_keys(self, index_key, key_prefix):
+        # DEL is variadic, so each batch of indexed keys goes out as a single
+        # command; the index itself is deleted last
+        keys = [key_prefix + key for key in self.redis_client.smembers(index_key)]
+        pipe = self.redis_client.pipeline(transaction=False)
+        for start in range(0, len(keys), self.write_batch_size):
+            pipe.delete(*keys[start:start + self.write_batch_size])
+        pipe.delete(index_key)
+        pipe.execute()
 
     def _clear_token_to_full_strings(self):
-        token_keys = self.redis_client.smembers("token_to_full_string_keys")
-        for key in token_keys:
-            try:
-                self.redis_client.expire(b"token:" + key, 0)
-            except UnicodeDecodeError:
-                continue
-        self.redis_client.expire("token_to_full_string_keys", 0)
+        self._delete_indexed_keys("token_to_full_string_keys", b"token:")
 
     def _clear_n_gram_to_tokens(self):
-        n_gram_keys = self.redis_client.smembers("n_gram_to_token_key")
-        for key in n_gram_keys:
-            try:
-                self.redis_client.expire(b"n_gram:" + key, 0)
-            except UnicodeDecodeError:
-                continue
-        self.redis_client.expire("n_gram_to_token_key", 0)
+        self._delete_indexed_keys("n_gram_to_token_key", b"n_gram:")
 
 
 class RedisStorageSpellChecker(RedisStorageTokenizer, AbstractSpellChecker):
@@ -415,12 +780,12 @@ class RedisStorageSpellChecker(RedisStorageTokenizer, AbstractSpellChecker):
         except TypeError:
             raise TypeError("default_empty must be an int")
 
-        key_count = self.redis_client.scard("token_to_count_key")
-        if not key_count:
-            raise RequiresTraining("Must call train_from_strings() before using this property")
         listified_tokens = [token for token in token_list]
-        keys = ["count:%s" % token for token in listified_tokens]
-        values = self.redis_client.mget(keys)
+        if not listified_tokens:
+            return {}
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.hmget("token_counts", listified_tokens)
+        values, = self._execute_with_training_check(pipe, "token_counts")
         token_to_count = {}
         for index, token in enumerate(listified_tokens):
 
@@ -438,26 +803,25 @@ class RedisStorageSpellChecker(RedisStorageTokenizer, AbstractSpellChecker):
         except TypeError:
             raise TypeError("default_empty must be an int")
 
-        key_count = self.redis_client.scard("token_to_count_key")
-        if not key_count:
-            raise RequiresTraining("Must call train_from_strings() before using this property")
-        count = self.redis_client.get("count:" + token) or default_empty
-        return int(count)
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.hget("token_counts", token)
+        count, = self._execute_with_training_check(pipe, "token_counts")
+        return int(count or default_empty)
 
     def _store_token_to_count(self, token_to_count_dict):
-        client = self.get_client()
-        for token, count in iteritems(token_to_count_dict):
-            count_key = "count:" + token
-            client.incr(count_key, count)
-            client.sadd("token_to_count_key", token)
-        if self.use_pipeline:
-            client.execute()
+        for batch in self._write_batches(token_to_count_dict):
+            client = self.get_client()
+            for token, count in batch:
+                client.hincrby("token_counts", token, count)
+            if self.use_pipeline:
+                client.execute()
 
     def _clear_spellcheck_storage(self):
-        tokens = self.redis_client.smembers("token_to_count_key")
-        for token in tokens:
-            self.redis_client.expire(b"count:" + token, 0)
-        self.redis_client.expire("token_to_count_key", 0)
+        self.redis_client.delete("token_counts")
+        # counts used to be stored one key per token, indexed by a set; a
+        # model trained before the move to the token_counts hash leaves
+        # those behind, and they are cleared along with it
+        self._delete_indexed_keys("token_to_count_key", b"count:")
 
 
 class RedisStorageAutoCompleter(RedisStorageSpellChecker, AbstractAutoCompleter):
@@ -11,24 +11,25 @@ from .autocompleter import (
     RedisStorageTokenizer,
     RequiresTraining,
 )
-redis_client = redis.from_url("http://localhost:6379")
+redis_client = redis.from_url("redis://localhost:6379")
 process_cache = {}
 
 
 class TestAutoCompleter(unittest.TestCase):
 
+    DICT_STORAGE_CLASSES = (DictStorageTokenizer, DictStorageSpellChecker)
+    REDIS_STORAGE_CLASSES = (RedisStorageTokenizer, RedisStorageSpellChecker)
+
     def setUp(self):
         super(TestAutoCompleter, self).setUp()
 
     def tearDown(self):
         super(TestAutoCompleter, self).tearDown()
 
-        for cls in (DictStorageTokenizer,
-                DictStorageSpellChecker):
+        for cls in self.DICT_STORAGE_CLASSES:
             cls(process_cache).bust_cache()
 
-        for cls in (RedisStorageTokenizer,
-                    RedisStorageSpellChecker):
+        for cls in self.REDIS_STORAGE_CLASSES:
             cls(redis_client).bust_cache()
 
     def test_train_from_strings_token_to_full_string(self):
@@ -52,6 +53,15 @@ class TestAutoCompleter(unittest.TestCase):
         tokens_for_h = DictStorageTokenizer(process_cache).get_tokens_for_n_gram("h")
         self.assertEqual(tokens_for_h, set(['hey', 'hello']))
 
+    def test_train_multiple_n_gram_to_tokens(self):
+        """ Verifies that updating one n gram does not leak into other n grams
+        that mapped to the same tokens. """
+        DictStorageTokenizer(process_cache).train_from_strings(["terminator"])
+        DictStorageTokenizer(process_cache).train_from_strings(["termite"])
+        tokenizer = DictStorageTokenizer(process_cache)
+        self.assertEqual(tokenizer.get_tokens_for_n_gram("term"), set(['terminator', 'termite']))
+        self.assertEqual(tokenizer.get_tokens_for_n_gram("termin"), set(['terminator']))
+
     def test_bust_cache(self):
         """ Verifies that the state of the class can be reset. """
         DictStorageTokenizer(process_cache).train_from_strings([
@@ -119,6 +129,57 @@ class TestAutoCompleter(unittest.TestCase):
             ]
         )
 
+    def test_train_with_processes(self):
+        """ Verifies that training across worker processes builds the same model. """
+        word_list = [
+            "hey there world",
+            "hello Commrades",
+            "hello world",
+            "today is a tremendous day",
+        ]
+        serial_cache = {}
+        DictStorageAutoCompleter(serial_cache).train_from_strings(word_list)
+        DictStorageAutoCompleter(process_cache, training_processes=3).train_from_strings(word_list)
+        # every training run stamps a fresh model version
+        del process_cache["model_version"], serial_cache["model_version"]
+        self.assertEqual(process_cache, serial_cache)
+
+        DictStorageAutoCompleter(process_cache, training_processes=3).train_from_strings([])
+
+    def test_max_n_gram_size(self):
+        """ Verifies that capping stored n grams still resolves longer prefixes. """
+        word_list = [
+            "hey there world",
+            "hello Commrades",
+            "hello world",
+            "help is on the way",
+        ]
+        DictStorageAutoCompleter(process_cache, max_n_gram_size=2).train_from_strings(word_list)
+        RedisStorageAutoCompleter(redis_client, max_n_gram_size=2).train_from_strings(word_list)
+        # the cap is stored with the model, so instances without one query it the same way
+        autocompleter = DictStorageAutoCompleter(process_cache)
+        self.assertIsNone(autocompleter.get_tokens_for_n_gram("hel"))
+        self.assertEqual(autocompleter.get_tokens_for_prefix("hel"), set(['hello', 'help']))
+        self.assertEqual(autocompleter.get_tokens_for_prefix("hello"), set(['hello']))
+        self.assertIsNone(autocompleter.get_tokens_for_prefix("helm"))
+        for autocompleter in (autocompleter, RedisStorageAutoCompleter(redis_client),
+                              RedisStorageAutoCompleter(redis_client, correction_cache_size=0)):
+            self.assertEqual(autocompleter.correct_phrase("hye wrld hel"), ["hey", "world", "hel"])
+            self.assertEqual(
+                sorted(autocompleter.guess_full_strings(["hello", "comm"])),
+                ['hello Commrades', 'hello world']
+            )
+
+        with self.assertRaises(ValueError):
+            DictStorageAutoCompleter(process_cache, min_n_gram_size=4, max_n_gram_size=2)
+
+    def test_spellchecker_on_tokenizer_training(self):
+        """ Verifies that known prefixes are kept when only the tokenizer was trained. """
+        DictStorageTokenizer(process_cache).train_from_strings(["hello world"])
+        RedisStorageTokenizer(redis_client).train_from_strings(["hello world"])
+        self.assertEqual(DictStorageSpellChecker(process_cache).correct_phrase("hel"), ["hel"])
+        self.assertEqual(RedisStorageSpellChecker(redis_client).correct_phrase("hel"), ["hel"])
+
     def test_redis_tokenizer(self):
         """ Verifies that Redis storage maintains existing logic. """
         RedisStorageTokenizer(redis_client).train_from_strings([
@@ -212,8 +273,62 @@ class TestAutoCompleter(unittest.TestCase):
         guessed_phrases = DictStorageAutoCompleter(
             process_cache
         ).guess_full_strings(corrected_tokens)
+        # both phrases score the same and are ordered alphabetically
         self.assertEqual(guessed_phrases, ['octopus', 'rabbit'])
 
+    def test_correction_cache_invalidated_by_training(self):
+        """ Verifies that cached corrections do not outlive further training. """
+        autocompleter = DictStorageAutoCompleter(process_cache)
+        autocompleter.train_from_strings(["octopus"])
+        self.assertEqual(autocompleter.correct_phrase("rabit"), ["rabit"])
+
+        autocompleter.train_from_strings(["rabbit"])
+        self.assertEqual(autocompleter.correct_phrase("rabit"), ["rabbit"])
+
+    def test_correction_cache_evicts_least_recently_used(self):
+        """ Verifies that a full correction cache keeps its recently used entries. """
+        autocompleter = DictStorageAutoCompleter(process_cache, correction_cache_size=2)
+        autocompleter.train_from_strings(["octopus", "rabbit", "turtle"])
+        autocompleter.correct_phrase("octipus rbbit octipus trtle")
+        self.assertEqual(list(autocompleter._corrected_tokens), ["octipus", "trtle"])
+
+    def test_correction_cache_invalidated_by_other_instances(self):
+        """ Verifies that cached corrections do not outlive training or busting
+        through another instance sharing the same storage. """
+        for autocompleter_cls, storage in ((DictStorageAutoCompleter, process_cache),
+                                           (RedisStorageAutoCompleter, redis_client)):
+            autocompleter = autocompleter_cls(storage)
+            autocompleter.train_from_strings(["octopus"])
+            self.assertEqual(autocompleter.correct_phrase("rabit"), ["rabit"])
+
+            autocompleter_cls(storage).train_from_strings(["rabbit"])
+            self.assertEqual(autocompleter.correct_phrase("rabit"), ["rabbit"])
+
+            autocompleter_cls(storage).bust_cache()
+            with self.assertRaises(RequiresTraining):
+                autocompleter.correct_phrase("rabit")
+
+    def test_redis_busted_by_other_client(self):
+        """ Verifies that a model busted through another Redis client is not
+        mistaken for a trained one by a client that already checked it. """
+        autocompleter = RedisStorageAutoCompleter(redis_client)
+        autocompleter.train_from_strings(["hello world"])
+        self.assertEqual(autocompleter.guess_full_strings(["hello"]), ["hello world"])
+
+        RedisStorageAutoCompleter(redis.from_url("redis://localhost:6379")).bust_cache()
+        with self.assertRaises(RequiresTraining):
+            autocompleter.guess_full_strings(["hello"])
+        with self.assertRaises(RequiresTraining):
+            autocompleter.get_count_for_token("hello")
+
+    def test_redis_bust_cache_clears_per_token_counts(self):
+        """ Verifies that busting clears counts stored one key per token by
+        earlier versions. """
+        redis_client.set("count:hello", 1)
+        redis_client.sadd("token_to_count_key", "hello")
+        RedisStorageSpellChecker(redis_client).bust_cache()
+        self.assertFalse(redis_client.exists("count:hello", "token_to_count_key"))
+
     def test_train_multiple_redis(self):
         """ Verifies that training updates a model rather than re-trains it. """
         word_list = [
@@ -232,6 +347,7 @@ class TestAutoCompleter(unittest.TestCase):
         guessed_phrases = (RedisStorageAutoCompleter(redis_client,
                                                      use_pipeline=False)
                            .guess_full_strings(corrected_tokens))
+        # both phrases score the same and are ordered alphabetically
         self.assertEqual(guessed_phrases, ['octopus', 'rabbit'])
 
     def test_something(self):
@@ -254,5 +370,19 @@ class TestAutoCompleter(unittest.TestCase):
         guessed_phrases = DictStorageAutoCompleter(
             process_cache
         ).guess_full_strings(["the", "nu"])
-        best_search_result = guessed_phrases[0]
-        self.assertIn("these", best_search_result)
+        # the two best results score the same and are ordered alphabetically
+        self.assertEqual(guessed_phrases[:2], ["the nu", "these nuts"])
+
+    def test_tokens_for_n_grams_union(self):
+        """ Verifies that the union of several n grams matches across backends. """
+        word_list = [
+            "hey there world",
+            "hello Commrades",
+            "hello world",
+        ]
+        DictStorageTokenizer(process_cache).train_from_strings(word_list)
+        RedisStorageTokenizer(redis_client).train_from_strings(word_list)
+        tokens = DictStorageTokenizer(process_cache).get_tokens_for_n_grams_union(["he", "wor"])
+        self.assertEqual(tokens, set(['hey', 'hello', 'world']))
+        tokens = RedisStorageTokenizer(redis_client).get_tokens_for_n_grams_union(["he", "wor"])
+        self.assertEqual({token.decode("utf-8") for token in tokens}, set(['hey', 'hello', 'world']))
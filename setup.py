@@ -14,9 +14,16 @@ setup(
     license="MIT",
     packages=find_packages(exclude=[]),
     include_package_data=True,
-    install_requires=["redis"],
+    python_requires=">=3.8",
+    install_requires=["redis>=2.10.3"],
     extras_require={},
     classifiers=[
-        'Programming Language :: Python :: 2.7',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
         'Topic :: Other/Nonlisted Topic'],
 )